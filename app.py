@@ -4,7 +4,7 @@ import time
 import os
 from src.data.loader import load_data
 from src.recommenders.rule_based import RuleBasedRecommender
-from src.recommenders.collaborative import CollaborativeRecommender
+from src.recommenders.collaborative import CollaborativeRecommender, choose_similarity
 from src.recommenders.deep_learning import DeepLearningRecommender
 from src.evaluation import calculate_rmse
 import tensorflow as tf
@@ -102,14 +102,25 @@ def get_rule_based_model(_ratings, _items):
 
 @st.cache_resource
 def get_collaborative_model(_ratings, _items):
-    return CollaborativeRecommender(_ratings, _items)
+    # The exact item-item matrix is dense; switch to approximate neighbors for big catalogs
+    model = CollaborativeRecommender(_ratings, _items, similarity=choose_similarity(_ratings))
+    # Precomputed recommendations from precompute_topn.py, if available
+    table_path = os.path.join('topn_tables', 'collaborative')
+    if os.path.isdir(table_path) and not model.load_topn_table(table_path):
+        # Built on other data: score every user live instead
+        print(f"Ignoring {table_path}: it does not match the current ratings")
+    return model
 
 @st.cache_resource
 def get_dl_model(_ratings, _items):
-    # This might take a few seconds
     model = DeepLearningRecommender(_ratings, _items)
+    # Precomputed table + the weights that produced it: no training needed
+    table_path = os.path.join('topn_tables', 'deep_learning')
+    if os.path.isdir(table_path) and model.load_topn_table(table_path):
+        return model
+    # This might take a few seconds
     with st.spinner('Initializing Neural Network...'):
-        model.train(epochs=3) # Short training for demo speed
+        model.train_optimized(epochs=3) # Short training for demo speed
     return model
 
 try:
@@ -139,6 +150,10 @@ with st.sidebar:
         ("Rule-Based (Popularity)", "Rule-Based (Top Rated)", "Collaborative Filtering", "Deep Learning","Hybrid (Conceptual)")
     )
     
+    category_options = ["All Categories"] + sorted(items['category'].dropna().unique())
+    selected_category = st.selectbox("Filter by Category", category_options)
+    category_filter = None if selected_category == "All Categories" else selected_category
+    
     st.markdown("---")
     st.info("System Status: **Online** 🟢")
     st.markdown("**Dataset Info:**")
@@ -176,16 +191,16 @@ with col2:
     recs = pd.DataFrame()
     
     if method == "Rule-Based (Popularity)":
-        recs = rb_engine.get_recommendations(method='popular')
+        recs = rb_engine.get_recommendations(method='popular', category=category_filter)
     elif method == "Rule-Based (Top Rated)":
-        recs = rb_engine.get_recommendations(method='top_rated')
+        recs = rb_engine.get_recommendations(method='top_rated', category=category_filter)
     elif method == "Collaborative Filtering":
-        recs = cf_engine.recommend(selected_user)
+        recs = cf_engine.recommend(selected_user, category=category_filter)
     elif method == "Deep Learning":
-        recs = dl_engine.recommend(selected_user)
+        recs = dl_engine.recommend(selected_user, category=category_filter)
     elif method == "Hybrid (Conceptual)":
         st.warning("Hybrid method is conceptual in this demo. Showing Deep Learning results as proxy.")
-        recs = dl_engine.recommend(selected_user)
+        recs = dl_engine.recommend(selected_user, category=category_filter)
 
     end_time = time.time()
     elapsed = end_time - start_time
@@ -0,0 +1,50 @@
+import argparse
+import os
+import time
+from src.data.loader import load_data
+from src.recommenders.collaborative import CollaborativeRecommender, choose_similarity
+from src.recommenders.deep_learning import DeepLearningRecommender
+from src.recommenders.topn_table import build_topn_table
+
+TABLES_DIR = 'topn_tables'
+
+
+def precompute_all(data_path='.', out_dir=TABLES_DIR, n=10, chunk_size=256, n_jobs=None, epochs=3,
+                   similarity=None):
+    """
+    Offline batch job: write every engine's top-n for every known user.
+    The app picks the tables up from out_dir and only scores missing users live.
+    similarity: 'exact' or 'lsh' for collaborative filtering (None = same rule as the app).
+    """
+    ratings, items = load_data(data_path)
+
+    print("Building Collaborative Filtering table...")
+    start = time.time()
+    cf = CollaborativeRecommender(ratings, items, similarity=similarity or choose_similarity(ratings))
+    build_topn_table(cf, os.path.join(out_dir, 'collaborative'), n=n, chunk_size=chunk_size, n_jobs=n_jobs)
+    print(f"Done in {time.time() - start:.1f}s")
+
+    print("Building Deep Learning table...")
+    start = time.time()
+    dl = DeepLearningRecommender(ratings, items)
+    dl.train_optimized(epochs=epochs)
+    dl_dir = os.path.join(out_dir, 'deep_learning')
+    build_topn_table(dl, dl_dir, n=n, chunk_size=chunk_size, n_jobs=n_jobs)
+    # The app loads these weights instead of retraining, so live fallbacks match the table
+    dl.save_topn_weights(dl_dir)
+    print(f"Done in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute top-n recommendations for all users.")
+    parser.add_argument('--data-path', default='.')
+    parser.add_argument('--out-dir', default=TABLES_DIR)
+    parser.add_argument('-n', type=int, default=10)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--similarity', choices=['exact', 'lsh'], default=None,
+                        help="Collaborative similarity (default: lsh above 5000 products)")
+    args = parser.parse_args()
+    precompute_all(args.data_path, args.out_dir, args.n, args.chunk_size, args.jobs, args.epochs,
+                   args.similarity)
@@ -1,8 +1,13 @@
+import argparse
 import pandas as pd
 import numpy as np
 import os
 
-def process_amazon_data():
+def process_amazon_data(max_products=2000):
+    """
+    max_products: keep only the most popular products (None keeps the whole catalog;
+    use CollaborativeRecommender(similarity='lsh') for catalogs that large).
+    """
     print("Processing Amazon Dataset...")
     
     # Check if download was successful
@@ -49,9 +54,10 @@ def process_amazon_data():
     # Let's filter to keep only "dense" data (users who rated > N items, products with > M ratings)
     
     print("Filtering data...")
-    # Keep top 2000 products by popularity
-    top_products = df['product_id'].value_counts().head(2000).index
-    df = df[df['product_id'].isin(top_products)]
+    # Keep top N products by popularity
+    if max_products:
+        top_products = df['product_id'].value_counts().head(max_products).index
+        df = df[df['product_id'].isin(top_products)]
     
     # Keep users with at least 5 reviews
     user_counts = df['user_id'].value_counts()
@@ -130,4 +136,7 @@ def process_amazon_data():
     print(df.head())
 
 if __name__ == "__main__":
-    process_amazon_data()
+    parser = argparse.ArgumentParser(description="Prepare the Amazon reviews dataset.")
+    parser.add_argument('--max-products', type=int, default=2000, help="0 keeps every product")
+    args = parser.parse_args()
+    process_amazon_data(max_products=args.max_products or None)
@@ -0,0 +1,28 @@
+import argparse
+from src.data.loader import load_data
+from src.sweep import run_sweep
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for the recommenders.")
+    parser.add_argument('--engine', choices=['deep_learning', 'rule_based'], default='deep_learning')
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--trials', type=int, default=None, help="Number of trials for random search")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--checkpoint-dir', default='sweep_checkpoints')
+    parser.add_argument('--output', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    ratings, items = load_data('.')
+    results = run_sweep(
+        ratings, items,
+        engine=args.engine,
+        search=args.search,
+        n_trials=args.trials,
+        n_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        checkpoint_root=args.checkpoint_dir
+    )
+    results.to_csv(args.output, index=False)
+    print(results.to_string(index=False))
+    print(f"Saved results to {args.output}")
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+class CategoryIndex:
+    """
+    Precomputed category -> product positions for one product ordering
+    (e.g. the columns of the user-item matrix, or the embedding rows).
+    Lets the engines mask the catalog before scoring instead of filtering afterwards.
+    """
+
+    def __init__(self, items_df, product_ids):
+        """
+        items_df: DataFrame with product_id and category (products.csv)
+        product_ids: the engine's products, in the order the engine indexes them
+        """
+        self.product_ids = np.asarray(product_ids)
+        self.position = {pid: i for i, pid in enumerate(self.product_ids.tolist())}
+
+        categories = items_df.drop_duplicates('product_id').set_index('product_id')['category']
+        categories = categories.reindex(self.product_ids).values
+
+        # One boolean mask (bitmap) and one index array per category
+        self.masks = {}
+        self.indices = {}
+        # Products missing from products.csv have no category and only match unfiltered queries
+        for category in pd.unique(categories[pd.notna(categories)]):
+            mask = categories == category
+            self.masks[category] = mask
+            self.indices[category] = np.flatnonzero(mask)
+
+    @property
+    def categories(self):
+        return sorted(self.masks)
+
+    def mask(self, category=None, exclude=None):
+        """
+        Boolean mask of allowed products.
+        category: a category name or a list of them (None = all categories)
+        exclude: product_ids to leave out
+        """
+        if category is None:
+            mask = np.ones(len(self.product_ids), dtype=bool)
+        else:
+            mask = np.zeros(len(self.product_ids), dtype=bool)
+            for name in _as_list(category):
+                if name in self.masks:
+                    mask |= self.masks[name]
+
+        if exclude is not None:
+            excluded = [self.position[pid] for pid in exclude if pid in self.position]
+            mask[excluded] = False
+        return mask
+
+    def candidate_indices(self, category=None, exclude=None):
+        """
+        Positions of the allowed products, or None when nothing is filtered.
+        """
+        if category is None and exclude is None:
+            return None
+        if exclude is None and isinstance(category, str):
+            # Single category: the precomputed array, no mask to build
+            return self.indices.get(category, np.empty(0, dtype=np.int64))
+        return np.flatnonzero(self.mask(category, exclude))
+
+
+def _as_list(category):
+    return [category] if isinstance(category, str) else list(category)
+
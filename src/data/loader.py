@@ -1,4 +1,5 @@
 import pandas as pd
+from scipy.sparse import csr_matrix
 import os
 
 def load_data(data_path='.'):
@@ -24,3 +25,17 @@ def get_user_item_matrix(ratings):
     Value: Rating
     """
     return ratings.pivot(index='user_id', columns='product_id', values='rating').fillna(0)
+
+def get_sparse_user_item_matrix(ratings):
+    """
+    Sparse version of the user-item matrix, for catalogs too big to pivot densely.
+    Rows and columns are in the same (sorted) order as get_user_item_matrix.
+    Returns (csr_matrix, user_ids, product_ids).
+    """
+    users = pd.Categorical(ratings['user_id'])
+    products = pd.Categorical(ratings['product_id'])
+    matrix = csr_matrix(
+        (ratings['rating'].values.astype('float64'), (users.codes, products.codes)),
+        shape=(len(users.categories), len(products.categories))
+    )
+    return matrix, users.categories.values, products.categories.values
@@ -7,3 +7,15 @@ def calculate_rmse(y_true, y_pred):
 
 def calculate_mae(y_true, y_pred):
     return mean_absolute_error(y_true, y_pred)
+
+def precision_at_k(recommended, relevant, k=10):
+    """
+    Mean precision@k over users.
+    recommended: dict user_id -> ranked list of product_ids
+    relevant: dict user_id -> set of product_ids the user actually liked
+    """
+    precisions = []
+    for user_id, liked in relevant.items():
+        top_k = list(recommended.get(user_id, []))[:k]
+        precisions.append(len(set(top_k) & liked) / k)
+    return float(np.mean(precisions)) if precisions else 0.0
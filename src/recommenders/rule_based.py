@@ -1,43 +1,68 @@
 import pandas as pd
+from src.data.category_index import CategoryIndex
 
 class RuleBasedRecommender:
     """
     Simulates a non-personalized recommendation engine.
     """
     
-    def __init__(self, ratings_df, items_df):
+    def __init__(self, ratings_df, items_df, min_interactions=50):
         """
         ratings_df: DataFrame containing user-product interactions (user_id, product_id, rating)
         items_df: DataFrame containing product details (product_id, product_name, category)
+        min_interactions: default minimum number of ratings for the top rated list
         """
         self.ratings = ratings_df
         self.items = items_df
+        self.min_interactions = min_interactions
+        self.category_index = CategoryIndex(items_df, items_df['product_id'].unique())
+        self.product_stats = self._product_stats()
         
-    def get_top_popular_products(self, n=10):
+    def _product_stats(self):
+        """
+        Rating count and average per product, aggregated once, in category_index order
+        so a category/exclude filter is a positional slice instead of a pass over all ratings.
+        Products without ratings keep count 0 and are never recommended.
+        """
+        product_ids = self.category_index.product_ids
+        stats = self.ratings.groupby('product_id')['rating'].agg(['count', 'mean']).reindex(product_ids)
+        details = self.items.drop_duplicates('product_id').set_index('product_id').reindex(product_ids)
+        return pd.DataFrame({
+            'product_id': product_ids,
+            'product_name': details['product_name'].values,
+            'category': details['category'].values,
+            'avg_rating': stats['mean'].values,
+            'count': stats['count'].fillna(0).astype(int).values
+        })
+
+    def _filtered_stats(self, category=None, exclude=None):
+        """
+        Stats of the rated products passing the filters.
+        """
+        candidates = self.category_index.candidate_indices(category, exclude)
+        stats = self.product_stats if candidates is None else self.product_stats.iloc[candidates]
+        return stats[stats['count'] > 0]
+        
+    def get_top_popular_products(self, n=10, category=None, exclude=None):
         """
         Recommends products based on the number of ratings (popularity).
         """
-        # Count number of ratings for each product
-        popularity_counts = self.ratings.groupby('product_id').size().reset_index(name='interaction_count')
+        popularity_counts = self._filtered_stats(category, exclude).rename(columns={'count': 'interaction_count'})
         
         # Sort by count descending
         top_products = popularity_counts.sort_values(by='interaction_count', ascending=False).head(n)
         
-        # Merge with item details to get titles
-        top_products = pd.merge(top_products, self.items, on='product_id')
-        
-        return top_products[['product_id', 'product_name', 'category', 'interaction_count']]
+        return top_products[['product_id', 'product_name', 'category', 'interaction_count']].reset_index(drop=True)
 
-    def get_top_rated_products(self, n=10, min_interactions=50):
+    def get_top_rated_products(self, n=10, min_interactions=None, category=None, exclude=None):
         """
         Recommends products based on average rating.
         Filters out products with few interactions to avoid noise.
         """
-        # Calculate average rating and count
-        product_stats = self.ratings.groupby('product_id').agg(
-            avg_rating=('rating', 'mean'),
-            count=('rating', 'count')
-        ).reset_index()
+        if min_interactions is None:
+            min_interactions = self.min_interactions
+        
+        product_stats = self._filtered_stats(category, exclude)
         
         # Filter by minimum interactions
         qualified_products = product_stats[product_stats['count'] >= min_interactions]
@@ -45,15 +70,16 @@ class RuleBasedRecommender:
         # Sort by average rating descending
         top_rated = qualified_products.sort_values(by='avg_rating', ascending=False).head(n)
         
-        # Merge with item details
-        top_rated = pd.merge(top_rated, self.items, on='product_id')
-        
-        return top_rated[['product_id', 'product_name', 'category', 'avg_rating', 'count']]
+        return top_rated[['product_id', 'product_name', 'category', 'avg_rating', 'count']].reset_index(drop=True)
         
-    def get_recommendations(self, method='popular', n=10):
+    def get_recommendations(self, method='popular', n=10, category=None, exclude=None):
+        """
+        category: restrict to one category (or a list of them)
+        exclude: product_ids that must not be recommended
+        """
         if method == 'popular':
-            return self.get_top_popular_products(n)
+            return self.get_top_popular_products(n, category=category, exclude=exclude)
         elif method == 'top_rated':
-            return self.get_top_rated_products(n)
+            return self.get_top_rated_products(n, category=category, exclude=exclude)
         else:
             raise ValueError("Unknown method. Choose 'popular' or 'top_rated'.")
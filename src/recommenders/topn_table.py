@@ -0,0 +1,173 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from src.data.category_index import CategoryIndex
+
+# Files making up a materialized table directory
+USER_IDS_FILE = 'user_ids.npy'
+PRODUCT_IDS_FILE = 'product_ids.npy'
+ITEMS_FILE = 'items.npy'
+SCORES_FILE = 'scores.npy'
+# Weights of the model that produced the table, for engines that need them (deep learning)
+MODEL_WEIGHTS_FILE = 'model.weights.h5'
+
+
+def top_n_indices(scores, n):
+    """
+    Row-wise top-n of a (users x products) score matrix.
+    Entries set to -inf (e.g. already rated products) are never returned;
+    rows with fewer than n candidates are padded with index -1 and score NaN.
+    """
+    n = min(n, scores.shape[1])
+    # argpartition is O(P) per row, then we only sort the n winners
+    part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    top_idx = np.take_along_axis(part, order, axis=1)
+    top_scores = np.take_along_axis(part_scores, order, axis=1)
+
+    missing = np.isneginf(top_scores)
+    top_idx = np.where(missing, -1, top_idx).astype('int32')
+    top_scores = np.where(missing, np.nan, top_scores).astype('float32')
+    return top_idx, top_scores
+
+
+def saveable_ids(ids):
+    # Object arrays (e.g. string ASINs) would need pickling; store them as fixed-width strings
+    ids = np.asarray(ids)
+    return ids.astype(str) if ids.dtype == object else ids
+
+
+def build_topn_table(recommender, out_dir, n=10, chunk_size=256, n_jobs=None):
+    """
+    Precompute the top-n recommendations of every known user and write them to out_dir.
+    The recommender must expose `table_user_ids`, `table_product_ids` and
+    `recommend_batch(user_indices, n)` returning (product indices, scores).
+    Users are scored in chunks on a thread pool (the heavy lifting is numpy/TensorFlow,
+    which release the GIL).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    user_ids = saveable_ids(recommender.table_user_ids)
+    product_ids = saveable_ids(recommender.table_product_ids)
+    num_users = len(user_ids)
+    n = min(n, len(product_ids))
+
+    # Write straight into memory-mapped .npy files so the full table never sits in RAM
+    items = np.lib.format.open_memmap(
+        os.path.join(out_dir, ITEMS_FILE), mode='w+', dtype='int32', shape=(num_users, n)
+    )
+    scores = np.lib.format.open_memmap(
+        os.path.join(out_dir, SCORES_FILE), mode='w+', dtype='float32', shape=(num_users, n)
+    )
+
+    def score_chunk(start):
+        stop = min(start + chunk_size, num_users)
+        chunk_items, chunk_scores = recommender.recommend_batch(np.arange(start, stop), n)
+        items[start:stop] = chunk_items
+        scores[start:stop] = chunk_scores
+
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+        list(pool.map(score_chunk, range(0, num_users, chunk_size)))
+
+    items.flush()
+    scores.flush()
+    np.save(os.path.join(out_dir, USER_IDS_FILE), user_ids)
+    np.save(os.path.join(out_dir, PRODUCT_IDS_FILE), product_ids)
+    return TopNTable(out_dir)
+
+
+class TopNTable:
+    """
+    Read-only view of a materialized top-n table.
+    Product indices and scores are memory-mapped; a user lookup is a dict hit
+    plus one row read.
+    """
+
+    def __init__(self, path, items_df=None):
+        """
+        items_df: products table; when given, lookups can be filtered by category
+        and joined with product details (lookup_items).
+        """
+        self.path = path
+        self.user_ids = np.load(os.path.join(path, USER_IDS_FILE))
+        self.product_ids = np.load(os.path.join(path, PRODUCT_IDS_FILE))
+        self.items = np.load(os.path.join(path, ITEMS_FILE), mmap_mode='r')
+        self.scores = np.load(os.path.join(path, SCORES_FILE), mmap_mode='r')
+        self.user2row = {u: i for i, u in enumerate(self.user_ids.tolist())}
+        self.n = self.items.shape[1]
+        self.category_index = CategoryIndex(items_df, self.product_ids) if items_df is not None else None
+        if items_df is not None:
+            # Products-table row of each table product (-1 if missing), resolved once so a hit
+            # reads its n detail rows instead of merging the whole products table
+            details = items_df.drop_duplicates('product_id')
+            self.detail_rows = pd.Index(saveable_ids(details['product_id'])).get_indexer(self.product_ids)
+            self.detail_ids = details['product_id'].values
+            self.detail_names = details['product_name'].values
+            self.detail_categories = details['category'].values
+
+    def built_on(self, user_ids, product_ids):
+        """
+        True if the table was built for exactly these users and products, in this order.
+        """
+        return (np.array_equal(self.user_ids, saveable_ids(user_ids))
+                and np.array_equal(self.product_ids, saveable_ids(product_ids)))
+
+    def __contains__(self, user_id):
+        return user_id in self.user2row
+
+    def lookup(self, user_id, n=10, category=None, exclude=None):
+        """
+        Return a DataFrame (product_id, score) with the user's top-n,
+        or None if the user is not in the table or the stored row can't supply n results
+        (too short, or too few left after the category/exclusion filters).
+        """
+        hit = self._lookup_rows(user_id, n, category, exclude)
+        if hit is None:
+            return None
+        row_items, row_scores = hit
+        return pd.DataFrame({
+            'product_id': self.product_ids[row_items],
+            'score': row_scores
+        })
+
+    def _lookup_rows(self, user_id, n, category, exclude):
+        # (product positions, scores) of the user's top-n, or None; see lookup()
+        row = self.user2row.get(user_id)
+        if row is None or n > self.n:
+            return None
+        filtered = category is not None or exclude is not None
+        if filtered and self.category_index is None:
+            return None
+
+        # Unfiltered lookups only touch the first n entries of the row
+        width = self.n if filtered else n
+        row_items = np.asarray(self.items[row, :width])
+        row_scores = np.asarray(self.scores[row, :width])
+        valid = row_items >= 0
+        if filtered:
+            allowed = self.category_index.mask(category, exclude)
+            valid &= allowed[np.where(valid, row_items, 0)]
+            if valid.sum() < n:
+                return None
+        return row_items[valid][:n], row_scores[valid][:n]
+
+    def lookup_items(self, user_id, n=10, category=None, exclude=None):
+        """
+        lookup() joined with the products table given at construction
+        (product_id, product_name, category, score); None when lookup() misses.
+        Products missing from the products table are dropped, as an inner merge would.
+        """
+        hit = self._lookup_rows(user_id, n, category, exclude)
+        if hit is None:
+            return None
+        row_items, row_scores = hit
+        rows = self.detail_rows[row_items]
+        known = rows >= 0
+        rows = rows[known]
+        return pd.DataFrame({
+            'product_id': self.detail_ids[rows],
+            'product_name': self.detail_names[rows],
+            'category': self.detail_categories[rows],
+            'score': row_scores[known]
+        })
@@ -0,0 +1,244 @@
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import random
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.evaluation import calculate_rmse, precision_at_k
+
+# Default search spaces; the first value of each list is the current hard-coded setting
+DL_PARAM_GRID = {
+    'embedding_size': [50, 32, 64],
+    'hidden_layers': [(128, 64, 32), (64, 32), (256, 128, 64)],
+    'learning_rate': [0.001, 0.003],
+    'batch_size': [64, 512, 2048],
+    'epochs': [5, 10],
+}
+
+RB_PARAM_GRID = {
+    'min_interactions': [50, 5, 10, 20, 100, 200],
+}
+
+# Per-worker state, filled once by _init_worker so trials don't re-send the data.
+# Each worker holds its own unpickled copy of the split; nothing is shared between processes.
+_DATA = {}
+
+
+def split_ratings(ratings, test_size=0.2, seed=42):
+    """
+    Random holdout split of the interactions used to score every trial.
+    """
+    test = ratings.sample(frac=test_size, random_state=seed)
+    train = ratings.drop(test.index)
+    return train, test
+
+
+def make_trials(param_grid, search='grid', n_trials=None, seed=42):
+    """
+    Expand a grid into a list of parameter dicts.
+    search='random' samples n_trials distinct combinations from the grid.
+    """
+    keys = list(param_grid)
+    trials = [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+    if search == 'random':
+        random.Random(seed).shuffle(trials)
+        trials = trials[:n_trials or len(trials)]
+    elif search != 'grid':
+        raise ValueError("Unknown search. Choose 'grid' or 'random'.")
+    return trials
+
+
+def _trial_id(engine, params):
+    # Stable across runs, so a rerun resumes the same checkpoints
+    key = json.dumps(params, sort_keys=True, default=list)
+    return f"{engine}_{hashlib.md5(key.encode()).hexdigest()[:10]}"
+
+
+def group_trials(trials):
+    """
+    Group trials that differ only in 'epochs', shortest first.
+    A group runs in one worker on one checkpoint, so each longer trial continues from
+    the shorter one's final epoch: the same result as training it from scratch,
+    independent of pool scheduling.
+    """
+    groups = {}
+    for params in trials:
+        key = json.dumps({k: v for k, v in params.items() if k != 'epochs'}, sort_keys=True, default=list)
+        groups.setdefault(key, []).append(params)
+    return [sorted(group, key=lambda p: p.get('epochs', 0)) for group in groups.values()]
+
+
+def _init_worker(train, test, items, threads, progress, lock):
+    # Thread limits must be in place before TensorFlow is imported in this process
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[var] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    _DATA.update(train=train, test=test, items=items, threads=threads, progress=progress, lock=lock)
+
+
+def _should_prune(epoch, val_loss, min_epochs=2, min_reports=3):
+    """
+    Median stopping rule: stop a trial whose val_loss at this epoch is worse than
+    the median of what other trials reported at the same epoch.
+    """
+    progress, lock = _DATA['progress'], _DATA['lock']
+    with lock:
+        reports = list(progress.get(epoch, []))
+        progress[epoch] = reports + [val_loss]
+    if epoch < min_epochs or len(reports) < min_reports:
+        return False
+    return val_loss > np.median(reports)
+
+
+def _run_deep_learning_group(group, checkpoint_root):
+    import tensorflow as tf
+    from src.recommenders.deep_learning import DeepLearningRecommender, configure_threading
+
+    train, test, items = _DATA['train'], _DATA['test'], _DATA['items']
+    configure_threading(_DATA['threads'], 1)
+
+    first = group[0]
+    dl = DeepLearningRecommender(
+        train, items,
+        embedding_size=first['embedding_size'],
+        hidden_layers=first['hidden_layers'],
+        learning_rate=first['learning_rate']
+    )
+
+    config = {k: v for k, v in first.items() if k != 'epochs'}
+    config_dir = os.path.join(checkpoint_root, 'trials', _trial_id('deep_learning', config))
+    # A checkpoint from an earlier run that is already past the shortest trial can't be reused
+    latest = tf.train.latest_checkpoint(config_dir) if os.path.isdir(config_dir) else None
+    if latest and tf.train.load_variable(latest, 'epoch/.ATTRIBUTES/VARIABLE_VALUE') > first['epochs']:
+        shutil.rmtree(config_dir)
+    os.makedirs(config_dir, exist_ok=True)
+
+    results = []
+    continued_from = 0
+    for params in group:
+        start = time.time()
+        pruned = []
+
+        def prune_callback(stats, budget=params['epochs']):
+            if stats['val_loss'] is None:
+                return False
+            # Always report, so longer trials are compared against this epoch too,
+            # but a trial that reached its epoch budget finished: only stopping earlier is pruning
+            if _should_prune(stats['epoch'], stats['val_loss']) and stats['epoch'] < budget:
+                pruned.append(stats['epoch'])
+                return True
+            return False
+
+        dl.train_optimized(
+            epochs=params['epochs'],
+            batch_size=params['batch_size'],
+            checkpoint_dir=config_dir,
+            epoch_callback=prune_callback
+        )
+
+        # Test RMSE on interactions whose user and product were seen in training
+        known = test[test['user_id'].isin(dl.user2idx) & test['product_id'].isin(dl.product2idx)]
+        predictions = dl.model.predict(
+            [known['user_id'].map(dl.user2idx).values, known['product_id'].map(dl.product2idx).values],
+            batch_size=8192, verbose=0
+        ).flatten()
+
+        results.append({
+            **params,
+            'rmse': calculate_rmse(known['rating'].values, predictions),
+            'epochs_run': dl.epochs_trained,
+            'continued_from_epoch': continued_from,
+            'pruned': bool(pruned),
+            'wall_time': time.time() - start,
+        })
+        if pruned:
+            # Longer runs of a pruned config are not worth training
+            break
+        continued_from = dl.epochs_trained
+    return results
+
+
+def _run_rule_based_trial(params, k=10, like_threshold=4):
+    from src.recommenders.rule_based import RuleBasedRecommender
+
+    train, test, items = _DATA['train'], _DATA['test'], _DATA['items']
+    rb = RuleBasedRecommender(train, items, min_interactions=params['min_interactions'])
+    top_ids = rb.get_top_rated_products(n=k)['product_id'].tolist()
+
+    liked = test[test['rating'] >= like_threshold].groupby('user_id')['product_id'].apply(set).to_dict()
+    recommended = {user_id: top_ids for user_id in liked}
+    return {'precision_at_k': precision_at_k(recommended, liked, k)}
+
+
+def _run_group(engine, group, checkpoint_root):
+    if engine == 'deep_learning':
+        return _run_deep_learning_group(group, checkpoint_root)
+    if engine == 'rule_based':
+        results = []
+        for params in group:
+            start = time.time()
+            metrics = _run_rule_based_trial(params)
+            results.append({**params, **metrics, 'wall_time': time.time() - start})
+        return results
+    raise ValueError("Unknown engine. Choose 'deep_learning' or 'rule_based'.")
+
+
+def run_sweep(ratings, items, engine='deep_learning', param_grid=None, search='grid', n_trials=None,
+              n_workers=None, threads_per_worker=1, checkpoint_root='sweep_checkpoints', seed=42):
+    """
+    Evaluate a grid/random search over one engine's hyperparameters on a process pool.
+    The holdout split is made once and pickled to each worker at start-up, so every
+    worker holds its own copy: memory grows with n_workers (plus the engines' own
+    structures built from it), not with the number of trials.
+    Trials that differ only in epochs share a checkpoint (see group_trials).
+    Returns a DataFrame ranked best first (lowest RMSE / highest precision@k).
+    """
+    if param_grid is None:
+        param_grid = DL_PARAM_GRID if engine == 'deep_learning' else RB_PARAM_GRID
+    trials = make_trials(param_grid, search, n_trials, seed)
+    train, test = split_ratings(ratings, seed=seed)
+
+    if n_workers is None:
+        n_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+
+    # spawn: TensorFlow is not fork-safe, and each worker has to set its thread limits before importing it
+    ctx = mp.get_context('spawn')
+    manager = ctx.Manager()
+    results = []
+    failures = []
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(train, test, items, threads_per_worker, manager.dict(), manager.Lock())
+    ) as pool:
+        groups = group_trials(trials)
+        futures = {pool.submit(_run_group, engine, group, checkpoint_root): group for group in groups}
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                failures.append(e)
+                print(f"Trials {futures[future]} failed: {e}")
+            print(f"Finished {done}/{len(groups)} trial groups")
+    manager.shutdown()
+
+    if not results:
+        raise RuntimeError(f"All {len(trials)} trials failed; first error: {failures[0]}") from failures[0]
+    if failures:
+        print(f"Warning: {len(failures)} of {len(groups)} trial groups failed and are missing from the results")
+
+    results = pd.DataFrame(results)
+    if engine == 'deep_learning':
+        # Pruned trials stopped short of their epoch budget, so they rank after completed ones
+        results = results.sort_values(by=['pruned', 'rmse'], ascending=True)
+    else:
+        results = results.sort_values(by='precision_at_k', ascending=False)
+    results = results.reset_index(drop=True)
+    results.insert(0, 'rank', results.index + 1)
+    return results